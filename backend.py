@@ -1,25 +1,40 @@
-from fastapi import FastAPI, HTTPException, Query, WebSocket
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.staticfiles import StaticFiles
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
 from typing import Any, Dict, List, Optional
 import asyncio
-import json
+import gzip
 import logging
+import orjson
 import sqlite3
-import time
 import os
 
-from database import DB_PATH, get_node_devices, get_node_teleop_groups, init_tables
+from MQTTStatusSync import MQTTStatusSync
+from database import (
+    DB_PATH,
+    get_node_bootstrap,
+    init_tables,
+    set_teleop_group_devices,
+    upsert_node,
+)
+from db_pool import acquire, close_pool, init_pool
 from rpc import (
     handle_jsonrpc_request,
     handle_jsonrpc_response,
     node_websockets,
+    send_node_frame,
+    shutdown_node_sender,
     notify_node_config_update,
     notify_node_start_teleop_group,
     notify_node_stop_teleop_group,
     call_node_rpc,
-    wait_for_response,
+    cached_node_rpc,
+    purge_node_rpc_cache,
 )
 from schemas import (
     DeviceCreate,
@@ -39,13 +54,22 @@ from schemas import (
     NodeRPCCallRequest,
 )
 
-# 配置日志
+# 优先使用uvloop事件循环（未安装时退回默认asyncio）
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
+# 配置日志（生产环境可通过LOG_LEVEL=WARNING降噪）
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get("LOG_LEVEL", "INFO"),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# 所有JSON响应默认走orjson序列化
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # 添加CORS中间件
 app.add_middleware(
@@ -56,68 +80,106 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _parse_config(raw, default):
+    """解析TEXT列中的JSON配置，失败时返回默认值"""
+    if not isinstance(raw, str):
+        return raw if raw is not None else default
+    try:
+        return orjson.loads(raw)
+    except (ValueError, TypeError):
+        return default
+
+
+def _parse_config_list(raw):
+    """解析遥操组config，保证返回列表"""
+    data = _parse_config(raw, [])
+    return data if isinstance(data, list) else []
+
+
+# 热点查询的SQL常量：语句文本不变可命中SQLite的prepared-statement缓存
+_SQL_LIST_NODES = "SELECT id, uuid,status, created_at, updated_at FROM nodes"
+_SQL_GET_NODE = _SQL_LIST_NODES + " WHERE id = ?"
+_SQL_LIST_NODES_BY_UUID = _SQL_LIST_NODES + " WHERE uuid = ?"
+_SQL_LIST_DEVICES = """SELECT id, node_id, name, description, category, type, config, status,
+                              created_at, updated_at FROM devices"""
+_SQL_GET_DEVICE = _SQL_LIST_DEVICES + " WHERE id = ?"
+_SQL_LIST_DEVICES_BY_NODE = _SQL_LIST_DEVICES + " WHERE node_id = ?"
+_SQL_LIST_VRS = "SELECT id, uuid, device_id, info, created_at, updated_at FROM vrs"
+_SQL_LIST_VRS_BY_UUID = _SQL_LIST_VRS + " WHERE uuid = ?"
+
+def _now_iso() -> str:
+    """当前UTC时间（与CURRENT_TIMESTAMP同格式），以参数绑定进UPDATE，
+    语句文本保持确定性、无需SQL端日期函数求值"""
+    return datetime.utcnow().isoformat(sep=" ", timespec="seconds")
+
+
+@lru_cache(maxsize=8)
+def _build_vr_update_sql(mask: int) -> str:
+    """按(uuid, device_id, info)字段掩码生成UPDATE语句。
+
+    2^3=8种组合各只拼接一次，之后语句文本固定，可命中SQLite的
+    prepared-statement缓存。参数顺序与掩码位序一致。
+    """
+    fields = []
+    if mask & 1:
+        fields.append("uuid = ?")
+    if mask & 2:
+        fields.append("device_id = ?")
+    if mask & 4:
+        fields.append("info = ?")
+    fields.append("updated_at = ?")
+    return f"UPDATE vrs SET {', '.join(fields)} WHERE id = ? RETURNING id"
+
+
 # 节点相关API路由
 @app.post("/api/node", response_model=NodeRegisterResponse, status_code=201)
 async def register_node(request: NodeRegisterRequest):
     """节点注册API"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        # 检查节点是否已存在
-        cursor.execute("SELECT id FROM nodes WHERE uuid = ?", (request.uuid,))
-        result = cursor.fetchone()
-        
-        if result:
-            node_id = result[0]
-        else:
-            # 创建新节点
-            cursor.execute("INSERT INTO nodes (uuid) VALUES (?)", (request.uuid,))
-            node_id = cursor.lastrowid
-            
-        conn.commit()
-        
-        # 获取该节点的设备和遥操组配置
-        devices = get_node_devices(node_id)
-        teleop_groups = get_node_teleop_groups(node_id)
-        
-        return NodeRegisterResponse(
-            id=node_id,
-            devices=devices,
-            teleop_groups=teleop_groups
-        )
-        
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    async with acquire() as conn:
+        def _register():
+            try:
+                # 单条UPSERT语句创建或查询节点
+                with conn:
+                    node_id = upsert_node(request.uuid, conn)
+                # 同一池内连接批量取回设备与遥操组配置
+                devices, teleop_groups = get_node_bootstrap(node_id, conn)
+                return node_id, devices, teleop_groups
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+        node_id, devices, teleop_groups = await run_in_threadpool(_register)
+
+    return NodeRegisterResponse(
+        id=node_id,
+        devices=devices,
+        teleop_groups=teleop_groups
+    )
 @app.get("/api/nodes", response_model=List[NodeResponse])
 async def get_nodes(uuid: Optional[str] = None):
     """获取节点列表"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    if uuid:
-        cursor.execute(
-            "SELECT id, uuid,status, created_at, updated_at FROM nodes WHERE uuid = ?",
-            (uuid,)
-        )
-    else:
-        cursor.execute("SELECT id, uuid,status, created_at, updated_at FROM nodes")
-    
-    nodes = []
-    for row in cursor.fetchall():
-        nodes.append(NodeResponse(
-            id=row[0],
-            uuid=row[1],
-            status=row[2],
-            created_at=row[3],
-            updated_at=row[4]
-        ))
-        
-    conn.close()
-    return nodes
+    async with acquire() as conn:
+        def _query():
+            cursor = conn.cursor()
+
+            if uuid:
+                cursor.execute(_SQL_LIST_NODES_BY_UUID, (uuid,))
+            else:
+                cursor.execute(_SQL_LIST_NODES)
+
+            return [
+                NodeResponse.model_construct(
+                    id=row["id"],
+                    uuid=row["uuid"],
+                    status=bool(row["status"]),
+                    created_at=row["created_at"],
+                    updated_at=row["updated_at"],
+                )
+                for row in cursor.fetchall()
+            ]
+
+        return await run_in_threadpool(_query)
 
 
 @app.get("/api/nodes/{node_id}/rpc")
@@ -135,14 +197,35 @@ async def get_node_rpc_methods(node_id: int) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=str(exc))
 
 
-@app.post("/api/nodes/{node_id}/rpc", response_model=RPCCallResponse)
-async def call_node_rpc_method(node_id: int, request: NodeRPCCallRequest) -> Dict[str, Any]:
+@app.post(
+    "/api/nodes/{node_id}/rpc",
+    response_model=RPCCallResponse,
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {"schema": NodeRPCCallRequest.model_json_schema()}
+            },
+            "required": True,
+        }
+    },
+)
+async def call_node_rpc_method(node_id: int, request: Request) -> Dict[str, Any]:
     """向指定节点转发RPC调用"""
     if node_id not in node_websockets:
         raise HTTPException(status_code=404, detail="Node not connected")
 
+    # 转发任意形状的params，直接解析原始请求体，省去Pydantic校验和重编码
+    try:
+        payload = orjson.loads(await request.body())
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+    method = payload.get("method") if isinstance(payload, dict) else None
+    if not isinstance(method, str) or not method:
+        raise HTTPException(status_code=400, detail="Missing method")
+
     try:
-        result = await call_node_rpc(node_id, request.method, request.params or {})
+        result = await call_node_rpc(node_id, method, payload.get("params") or {})
         return {"result": result}
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
@@ -151,28 +234,25 @@ async def call_node_rpc_method(node_id: int, request: NodeRPCCallRequest) -> Dic
 @app.get("/api/nodes/{node_id}", response_model=NodeResponse)
 async def get_node(node_id: int):
     """获取单个节点详情"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "SELECT id, uuid,status, created_at, updated_at FROM nodes WHERE id = ?",
-        (node_id,)
-    )
-    
-    row = cursor.fetchone()
-    if not row:
-        raise HTTPException(status_code=404, detail="Node not found")
-        
-    node = NodeResponse(
-        id=row[0],
-        uuid=row[1],
-        status=row[2],
-        created_at=row[3],
-        updated_at=row[4]
-    )
-        
-    conn.close()
-    return node
+    async with acquire() as conn:
+        def _query():
+            cursor = conn.cursor()
+
+            cursor.execute(_SQL_GET_NODE, (node_id,))
+
+            row = cursor.fetchone()
+            if not row:
+                raise HTTPException(status_code=404, detail="Node not found")
+
+            return NodeResponse.model_construct(
+                id=row["id"],
+                uuid=row["uuid"],
+                status=bool(row["status"]),
+                created_at=row["created_at"],
+                updated_at=row["updated_at"],
+            )
+
+        return await run_in_threadpool(_query)
 
 # 设备相关API路由
 @app.get("/api/device/categories")
@@ -181,25 +261,9 @@ async def get_device_categories(node_id: int = Query(...)):
     # 通过RPC从Node获取设备类型信息
     if node_id not in node_websockets:
         raise HTTPException(status_code=404, detail="Node not connected")
-        
+
     try:
-        # 直接发送RPC请求，不使用WebSocketRPC
-        websocket = node_websockets[node_id]
-        rpc_id = int(time.time() * 1000)
-        rpc_request = {
-            "jsonrpc": "2.0",
-            "method": "node.get_device_types",
-            "params": {},
-            "id": rpc_id
-        }
-        print(f"asd{json.dumps(rpc_request)}")
-        # 发送请求
-        await websocket.send_text(json.dumps(rpc_request))
-        print("发送成功")
-        
-        # 等待并处理响应
-        device_types_info = await wait_for_response(websocket, node_id, rpc_id)
-        print(device_types_info)
+        device_types_info = await cached_node_rpc(node_id, "node.get_device_types")
         categories = list(device_types_info.keys())
         return categories
     except Exception as e:
@@ -211,23 +275,9 @@ async def get_device_types_info(node_id: int = Query(...)):
     # 通过RPC从Node获取设备类型信息
     if node_id not in node_websockets:
         raise HTTPException(status_code=404, detail="Node not connected")
-        
+
     try:
-        # 直接发送RPC请求，不使用WebSocketRPC
-        websocket = node_websockets[node_id]
-        rpc_id = int(time.time() * 1000)
-        rpc_request = {
-            "jsonrpc": "2.0",
-            "method": "node.get_device_types",
-            "params": {},
-            "id": rpc_id
-        }
-        
-        # 发送请求
-        await websocket.send_text(json.dumps(rpc_request))
-        
-        # 等待并处理响应
-        device_types_info = await wait_for_response(websocket, node_id, rpc_id)
+        device_types_info = await cached_node_rpc(node_id, "node.get_device_types")
         return device_types_info
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -235,267 +285,186 @@ async def get_device_types_info(node_id: int = Query(...)):
 @app.get("/api/devices", response_model=List[DeviceResponse])
 async def get_devices(node_id: Optional[int] = Query(None)):
     """获取所有设备列表"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    if node_id is not None:
-        cursor.execute(
-            """SELECT id, node_id, name, description, category, type, config, status, 
-                      created_at, updated_at FROM devices WHERE node_id = ?""",
-            (node_id,)
-        )
-    else:
-        cursor.execute(
-            """SELECT id, node_id, name, description, category, type, config, status, 
-                      created_at, updated_at FROM devices"""
-        )
-    
-    devices = []
-    for row in cursor.fetchall():
-        try:
-            config_data = json.loads(row[6]) if isinstance(row[6], str) else row[6]
-        except:
-            config_data = {}
-            
-        devices.append(DeviceResponse(
-            id=row[0],
-            node_id=row[1],
-            name=row[2],
-            description=row[3],
-            category=row[4],
-            type=row[5],
-            config=config_data,
-            status=row[7] or 0,
-            created_at=row[8],
-            updated_at=row[9]
-        ))
-        
-    conn.close()
-    return devices
+    async with acquire() as conn:
+        def _query():
+            cursor = conn.cursor()
+
+            if node_id is not None:
+                cursor.execute(_SQL_LIST_DEVICES_BY_NODE, (node_id,))
+            else:
+                cursor.execute(_SQL_LIST_DEVICES)
+
+            rows = cursor.fetchall()
+            # 相同的config字符串只解析一次（多数设备共享默认配置）
+            parsed = {
+                raw: _parse_config(raw, {})
+                for raw in {r["config"] for r in rows if isinstance(r["config"], str)}
+            }
+            return [
+                DeviceResponse.model_construct(
+                    id=row["id"],
+                    node_id=row["node_id"],
+                    name=row["name"],
+                    description=row["description"],
+                    category=row["category"],
+                    type=row["type"],
+                    config=parsed.get(row["config"], row["config"] or {}),
+                    status=row["status"] or 0,
+                    created_at=row["created_at"],
+                    updated_at=row["updated_at"],
+                )
+                for row in rows
+            ]
+
+        return await run_in_threadpool(_query)
 
 @app.get("/api/devices/{device_id}", response_model=DeviceResponse)
 async def get_device(device_id: int):
     """获取单个设备详情"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        """SELECT id, node_id, name, description, category, type, config, status, 
-                  created_at, updated_at FROM devices WHERE id = ?""",
-        (device_id,)
-    )
-    
-    row = cursor.fetchone()
-    if not row:
-        raise HTTPException(status_code=404, detail="Device not found")
-        
-    try:
-        config_data = json.loads(row[6]) if isinstance(row[6], str) else row[6]
-    except:
-        config_data = {}
-        
-    device = DeviceResponse(
-        id=row[0],
-        node_id=row[1],
-        name=row[2],
-        description=row[3],
-        category=row[4],
-        type=row[5],
-        config=config_data,
-        status=row[7] or 0,
-        created_at=row[8],
-        updated_at=row[9]
-    )
-        
-    conn.close()
-    return device
+    async with acquire() as conn:
+        def _query():
+            cursor = conn.cursor()
+
+            cursor.execute(_SQL_GET_DEVICE, (device_id,))
+
+            row = cursor.fetchone()
+            if not row:
+                raise HTTPException(status_code=404, detail="Device not found")
+
+            return DeviceResponse.model_construct(
+                id=row["id"],
+                node_id=row["node_id"],
+                name=row["name"],
+                description=row["description"],
+                category=row["category"],
+                type=row["type"],
+                config=_parse_config(row["config"], {}),
+                status=row["status"] or 0,
+                created_at=row["created_at"],
+                updated_at=row["updated_at"],
+            )
+
+        return await run_in_threadpool(_query)
 
 @app.post("/api/devices", status_code=201)
-async def create_device(device: DeviceCreate):
+async def create_device(device: DeviceCreate, background: BackgroundTasks):
     """新增设备"""
     # 验证节点是否存在且连接
     if device.node_id not in node_websockets:
         raise HTTPException(status_code=400, detail="Node not connected")
-    
-    # 对config进行测试，test成功才能创建设备
-    # try:
-    #     # 直接发送RPC请求，不使用WebSocketRPC
-    #     websocket = node_websockets[device.node_id]
-    #     rpc_id = int(time.time() * 1000)
-    #     rpc_request = {
-    #         "jsonrpc": "2.0",
-    #         "method": "node.test_device",
-    #         "params": {
-    #             "category": device.category,
-    #             "type": device.type,
-    #             "config": device.config
-    #         },
-    #         "id": rpc_id
-    #     }
-        
-    #     # 发送请求
-    #     await websocket.send_text(json.dumps(rpc_request))
-        
-    #     # 等待并处理响应
-    #     test_result = await wait_for_response(websocket, node_id, rpc_id)
-        
-    #     # 检查测试结果，确保test_result是字典类型
-    #     if not isinstance(test_result, dict) or test_result.get("success") is not True:
-    #         error_msg = test_result.get("error", "Device test failed") if isinstance(test_result, dict) else "Device test failed"
-    #         raise HTTPException(status_code=400, detail=error_msg)
-    # except asyncio.TimeoutError:
-    #     raise HTTPException(status_code=504, detail="Device test timeout")
-    # except Exception as e:
-    #     raise HTTPException(status_code=500, detail=f"Device test error: {str(e)}")
-    
+
+    # config只序列化一次，事务内复用
+    config_json = orjson.dumps(device.config).decode()
+
     # 在数据库中创建设备
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute(
-            """INSERT INTO devices (node_id, name, description, category, type, config) 
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (device.node_id, device.name, device.description, device.category, 
-             device.type, json.dumps(device.config))
-        )
-        device_id = cursor.lastrowid
-        conn.commit()
-        
-        # 通知对应的Node更新配置
-        await notify_node_config_update(device.node_id)
-        
-        # 返回标准化的响应
-        return {
-            "message": "设备已添加", 
-            "id": device_id,
-            "device_id": device_id
-        }
-        
-    except sqlite3.IntegrityError as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=f"Database constraint error: {str(e)}")
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    async with acquire() as conn:
+        def _insert():
+            cursor = conn.cursor()
+
+            try:
+                with conn:
+                    cursor.execute(
+                        """INSERT INTO devices (node_id, name, description, category, type, config)
+                           VALUES (?, ?, ?, ?, ?, ?)""",
+                        (device.node_id, device.name, device.description, device.category,
+                         device.type, config_json)
+                    )
+                    return cursor.lastrowid
+
+            except sqlite3.IntegrityError as e:
+                raise HTTPException(status_code=400, detail=f"Database constraint error: {str(e)}")
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+        device_id = await run_in_threadpool(_insert)
+
+    # 提交成功后在后台通知对应的Node更新配置，不阻塞响应
+    background.add_task(notify_node_config_update, device.node_id)
+
+    # 返回标准化的响应
+    return {
+        "message": "设备已添加",
+        "id": device_id,
+        "device_id": device_id
+    }
 
 @app.put("/api/devices/{device_id}")
-async def update_device(device_id: int, device: DeviceUpdate):
+async def update_device(device_id: int, device: DeviceUpdate, background: BackgroundTasks):
     """更新设备"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        # 检查设备是否存在
-        cursor.execute("SELECT id, node_id FROM devices WHERE id = ?", (device_id,))
-        row = cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Device not found")
-            
-        node_id = row[1]
-        
-        # # 对config进行测试，test成功才能更新设备
-        # if node_id not in node_websockets:
-        #     raise HTTPException(status_code=400, detail="Node not connected")
-        
-        # try:
-        #     # 直接发送RPC请求，不使用WebSocketRPC
-        #     websocket = node_websockets[node_id]
-        #     rpc_id = int(time.time() * 1000)
-        #     rpc_request = {
-        #         "jsonrpc": "2.0",
-        #         "method": "node.test_device",
-        #         "params": {
-        #             "category": device.category,
-        #             "type": device.type,
-        #             "config": device.config
-        #         },
-        #         "id": rpc_id
-        #     }
-            
-        #     # 发送请求
-        #     await websocket.send_text(json.dumps(rpc_request))
-            
-        #     # 等待并处理响应
-        #     test_result = await wait_for_response(websocket, node_id, rpc_id)
-            
-        #     # 检查测试结果，确保test_result是字典类型
-        #     if not isinstance(test_result, dict) or test_result.get("success") is not True:
-        #         raise HTTPException(status_code=400, detail="Device test failed")
-        # except Exception as e:
-        #     raise HTTPException(status_code=500, detail=f"Device test error: {str(e)}")
-        
-        # 更新设备信息
-        cursor.execute(
-            """UPDATE devices 
-               SET name = ?, description = ?, category = ?, type = ?, config = ?, updated_at = CURRENT_TIMESTAMP
-               WHERE id = ?""",
-            (device.name, device.description, device.category, device.type, 
-             json.dumps(device.config), device_id)
-        )
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Device not found")
-            
-        conn.commit()
-        
-        # 通知对应的Node更新配置
-        await notify_node_config_update(node_id)
-        
-        return {"message": "设备已更新"}
-        
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    config_json = orjson.dumps(device.config).decode()
+
+    async with acquire() as conn:
+        def _update():
+            cursor = conn.cursor()
+
+            try:
+                # 单条语句完成更新并取回node_id
+                with conn:
+                    cursor.execute(
+                        """UPDATE devices
+                           SET name = ?, description = ?, category = ?, type = ?, config = ?, updated_at = ?
+                           WHERE id = ? RETURNING node_id""",
+                        (device.name, device.description, device.category, device.type,
+                         config_json, _now_iso(), device_id)
+                    )
+                    row = cursor.fetchone()
+                    if not row:
+                        raise HTTPException(status_code=404, detail="Device not found")
+                    return row[0]
+
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+        node_id = await run_in_threadpool(_update)
+
+    # 提交成功后在后台通知对应的Node更新配置，不阻塞响应
+    background.add_task(notify_node_config_update, node_id)
+
+    return {"message": "设备已更新"}
 
 @app.delete("/api/devices/{device_id}")
-async def delete_device(device_id: int):
+async def delete_device(device_id: int, background: BackgroundTasks):
     """删除设备"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        # 检查设备是否存在并获取node_id
-        cursor.execute("SELECT id, node_id FROM devices WHERE id = ?", (device_id,))
-        row = cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Device not found")
-            
-        node_id = row[1]
-        
-        # 删除设备
-        cursor.execute("DELETE FROM devices WHERE id = ?", (device_id,))
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Device not found")
-            
-        conn.commit()
-        
-        # 通知对应的Node更新配置
-        await notify_node_config_update(node_id)
-        
-        return {"message": "设备已删除"}
-        
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    async with acquire() as conn:
+        def _delete():
+            cursor = conn.cursor()
+
+            try:
+                # 单条语句完成删除并取回node_id
+                with conn:
+                    cursor.execute(
+                        "DELETE FROM devices WHERE id = ? RETURNING node_id", (device_id,)
+                    )
+                    row = cursor.fetchone()
+                    if not row:
+                        raise HTTPException(status_code=404, detail="Device not found")
+                    return row[0]
+
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+        node_id = await run_in_threadpool(_delete)
+
+    # 提交成功后在后台通知对应的Node更新配置，不阻塞响应
+    background.add_task(notify_node_config_update, node_id)
+
+    return {"message": "设备已删除"}
 
 @app.post("/api/devices/test", description="测试设备连接")
 async def test_device_connection(device_test_request: DeviceTestRequest):
     """
     测试设备连接
-    
+
     该端点用于测试指定设备是否能成功连接。需要提供节点ID、设备类别、设备类型和设备配置参数。
-    
+
     示例请求体:
     {
         "node_id": 1,
-        "category": "robot", 
+        "category": "robot",
         "type": "RealMan",
         "config": {
             "ip": "192.168.1.100",
@@ -510,34 +479,24 @@ async def test_device_connection(device_test_request: DeviceTestRequest):
     # 验证节点是否存在且连接
     if node_id not in node_websockets:
         raise HTTPException(status_code=400, detail="Node not connected")
-    
+
     try:
-        # 直接发送RPC请求，不使用WebSocketRPC
-        websocket = node_websockets[node_id]
-        rpc_id = int(time.time() * 1000)
-        rpc_request = {
-            "jsonrpc": "2.0",
-            "method": "node.test_device",
-            "params": {
+        test_result = await call_node_rpc(
+            node_id,
+            "node.test_device",
+            {
                 "category": category,
                 "type": type_name,
                 "config": config
             },
-            "id": rpc_id
-        }
-        
-        # 发送请求
-        await websocket.send_text(json.dumps(rpc_request))
-        
-        # 等待并处理响应
-        test_result = await wait_for_response(websocket, node_id, rpc_id)
-        
+        )
+
         # 检查测试结果，确保test_result是字典类型
         if not isinstance(test_result, dict) or test_result.get("success") is not True:
             raise HTTPException(status_code=400, detail="Device test failed")
-            
+
         return test_result
-        
+
     except asyncio.TimeoutError:
         raise HTTPException(status_code=504, detail="Device test timeout")
     except Exception as e:
@@ -550,23 +509,9 @@ async def get_teleop_group_types_info(node_id: int = Query(...)):
     # 通过RPC从Node获取遥操组类型信息
     if node_id not in node_websockets:
         raise HTTPException(status_code=404, detail="Node not connected")
-        
+
     try:
-        # 直接发送RPC请求，不使用WebSocketRPC
-        websocket = node_websockets[node_id]
-        rpc_id = int(time.time() * 1000)
-        rpc_request = {
-            "jsonrpc": "2.0",
-            "method": "node.get_teleop_group_types",
-            "params": {},
-            "id": rpc_id
-        }
-        
-        # 发送请求
-        await websocket.send_text(json.dumps(rpc_request))
-        
-        # 等待并处理响应
-        teleop_group_types_info = await wait_for_response(websocket, node_id, rpc_id)
+        teleop_group_types_info = await cached_node_rpc(node_id, "node.get_teleop_group_types")
         return teleop_group_types_info
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -578,527 +523,520 @@ async def get_teleop_groups(
     node_id: Optional[int] = Query(None)
 ):
     """获取所有遥操作组列表"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # 构造查询语句
-    query = """SELECT id, node_id, name, description, type, config, status,capture_status, 
-                      created_at, updated_at FROM teleop_groups"""
-    params = []
-    
-    conditions = []
-    if name:
-        conditions.append("name LIKE ?")
-        params.append(f"%{name}%")
-    if node_id is not None:
-        conditions.append("node_id = ?")
-        params.append(node_id)
-    if device_id is not None:
-        conditions.append("config LIKE ?")
-        params.append(f"%{device_id}%")
-        
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
-        
-    query += " ORDER BY id"
-    
-    cursor.execute(query, params)
-    
-    groups = []
-    for row in cursor.fetchall():
-        try:
-            config_data = json.loads(row[5]) if isinstance(row[5], str) else row[5]
-            # 确保config是列表类型
-            if not isinstance(config_data, list):
-                config_data = []
-        except:
-            config_data = []
-            
-        groups.append(TeleopGroupResponse(
-            id=row[0],
-            node_id=row[1],
-            name=row[2],
-            description=row[3],
-            type=row[4],
-            config=config_data,
-            status=row[6],
-            capture_status=row[7],
-            created_at=row[8],
-            updated_at=row[9]
-        ))
-        
-    conn.close()
-    return groups
+    async with acquire() as conn:
+        def _query():
+            cursor = conn.cursor()
+
+            # 构造查询语句
+            query = """SELECT id, node_id, name, description, type, config, status,capture_status,
+                              created_at, updated_at FROM teleop_groups"""
+            params = []
+
+            conditions = []
+            if name:
+                conditions.append("name LIKE ?")
+                params.append(f"%{name}%")
+            if node_id is not None:
+                conditions.append("node_id = ?")
+                params.append(node_id)
+            if device_id is not None:
+                conditions.append(
+                    "id IN (SELECT teleop_group_id FROM teleop_group_devices WHERE device_id = ?)"
+                )
+                params.append(device_id)
+
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+
+            query += " ORDER BY id"
+
+            cursor.execute(query, params)
+
+            rows = cursor.fetchall()
+            # 相同的config字符串只解析一次
+            parsed = {
+                raw: _parse_config_list(raw)
+                for raw in {r["config"] for r in rows if isinstance(r["config"], str)}
+            }
+            return [
+                TeleopGroupResponse.model_construct(
+                    id=row["id"],
+                    node_id=row["node_id"],
+                    name=row["name"],
+                    description=row["description"],
+                    type=row["type"],
+                    config=parsed.get(row["config"], []),
+                    status=row["status"],
+                    capture_status=row["capture_status"],
+                    created_at=row["created_at"],
+                    updated_at=row["updated_at"],
+                )
+                for row in rows
+            ]
+
+        return await run_in_threadpool(_query)
 
 @app.get("/api/teleop-groups/{id}", response_model=TeleopGroupResponse)
 async def get_teleop_group(id: int):
     """获取单个遥操组详情"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        """SELECT id, node_id, name, description, type, config, status,capture_status, 
-                  created_at, updated_at FROM teleop_groups WHERE id = ?""",
-        (id,)
-    )
-    
-    row = cursor.fetchone()
-    if not row:
-        raise HTTPException(status_code=404, detail="Teleop group not found")
-        
-    try:
-        config_data = json.loads(row[5]) if isinstance(row[5], str) else row[5]
-        # 确保config是列表类型
-        if not isinstance(config_data, list):
-            config_data = []
-    except:
-        config_data = []
-        
-    teleop_group = TeleopGroupResponse(
-        id=row[0],
-        node_id=row[1],
-        name=row[2],
-        description=row[3],
-        type=row[4],
-        config=config_data,
-        status=row[6],
-        capture_status=row[7],
-        created_at=row[8],
-        updated_at=row[9]
-    )
-        
-    conn.close()
-    return teleop_group
+    async with acquire() as conn:
+        def _query():
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """SELECT id, node_id, name, description, type, config, status,capture_status,
+                          created_at, updated_at FROM teleop_groups WHERE id = ?""",
+                (id,)
+            )
+
+            row = cursor.fetchone()
+            if not row:
+                raise HTTPException(status_code=404, detail="Teleop group not found")
+
+            return TeleopGroupResponse.model_construct(
+                id=row["id"],
+                node_id=row["node_id"],
+                name=row["name"],
+                description=row["description"],
+                type=row["type"],
+                config=_parse_config_list(row["config"]),
+                status=row["status"],
+                capture_status=row["capture_status"],
+                created_at=row["created_at"],
+                updated_at=row["updated_at"],
+            )
+
+        return await run_in_threadpool(_query)
 
 @app.post("/api/teleop-groups", status_code=201)
-async def create_teleop_group(group: TeleopGroupCreate):
+async def create_teleop_group(group: TeleopGroupCreate, background: BackgroundTasks):
     """新增遥操组"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        # 验证节点是否存在
-        cursor.execute("SELECT id FROM nodes WHERE id = ?", (group.node_id,))
-        if not cursor.fetchone():
-            raise HTTPException(status_code=400, detail="Node not found")
-            
-        cursor.execute(
-            """INSERT INTO teleop_groups (node_id, name, description, type, config) 
-               VALUES (?, ?, ?, ?, ?)""",
-            (group.node_id, group.name, group.description, group.type, 
-             json.dumps(group.config))
-        )
-        id = cursor.lastrowid
-        conn.commit()
-        
-        # 通知对应的Node更新配置
-        await notify_node_config_update(group.node_id)
-        
-        return {"message": "遥操组已添加", "id": id}
-        
-    except HTTPException:
-        conn.rollback()
-        raise
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    config_json = orjson.dumps(group.config).decode()
+
+    async with acquire() as conn:
+        def _insert():
+            cursor = conn.cursor()
+
+            try:
+                with conn:
+                    # 验证节点是否存在
+                    cursor.execute("SELECT id FROM nodes WHERE id = ?", (group.node_id,))
+                    if not cursor.fetchone():
+                        raise HTTPException(status_code=400, detail="Node not found")
+
+                    cursor.execute(
+                        """INSERT INTO teleop_groups (node_id, name, description, type, config)
+                           VALUES (?, ?, ?, ?, ?)""",
+                        (group.node_id, group.name, group.description, group.type,
+                         config_json)
+                    )
+                    id = cursor.lastrowid
+                    set_teleop_group_devices(conn, id, group.config)
+                    return id
+
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+        id = await run_in_threadpool(_insert)
+
+    # 提交成功后在后台通知对应的Node更新配置，不阻塞响应
+    background.add_task(notify_node_config_update, group.node_id)
+
+    return {"message": "遥操组已添加", "id": id}
 
 @app.put("/api/teleop-groups/{id}")
-async def update_teleop_group(id: int, group: TeleopGroupUpdate):
+async def update_teleop_group(id: int, group: TeleopGroupUpdate, background: BackgroundTasks):
     """更新遥操组"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        # 检查遥操组是否存在并获取node_id
-        cursor.execute("SELECT id, node_id FROM teleop_groups WHERE id = ?", (id,))
-        row = cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Teleop group not found")
-            
-        node_id = row[1]
-        
-        # 如果没有提供status，则不更新status
-        cursor.execute(
-            """UPDATE teleop_groups SET name=?, description=?, type=?, config=?, updated_at=datetime('now') 
-                WHERE id = ?""",
-            (group.name, group.description, group.type, json.dumps(group.config), id)
-        )
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Teleop group not found")
-            
-        conn.commit()
-        
-        # 通知对应的Node更新配置
-        await notify_node_config_update(node_id)
-        
-        return {"message": "遥操组已更新"}
-        
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    config_json = orjson.dumps(group.config).decode()
+
+    async with acquire() as conn:
+        def _update():
+            cursor = conn.cursor()
+
+            try:
+                # 如果没有提供status，则不更新status；单条语句完成更新并取回node_id
+                with conn:
+                    cursor.execute(
+                        """UPDATE teleop_groups SET name=?, description=?, type=?, config=?, updated_at=?
+                            WHERE id = ? RETURNING node_id""",
+                        (group.name, group.description, group.type, config_json, _now_iso(), id)
+                    )
+                    row = cursor.fetchone()
+                    if not row:
+                        raise HTTPException(status_code=404, detail="Teleop group not found")
+
+                    set_teleop_group_devices(conn, id, group.config)
+                    return row[0]
+
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+        node_id = await run_in_threadpool(_update)
+
+    # 提交成功后在后台通知对应的Node更新配置，不阻塞响应
+    background.add_task(notify_node_config_update, node_id)
+
+    return {"message": "遥操组已更新"}
 
 @app.post("/api/teleop-groups/{id}/start")
 async def start_teleop_group(id: int):
     """启动遥操组"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # 获取遥操组信息
-    cursor.execute(
-        """SELECT id, node_id, name, description, type, config, status 
-           FROM teleop_groups WHERE id = ?""",
-        (id,)
-    )
-    
-    row = cursor.fetchone()
+    # 连接只在两次数据库操作期间占用，RPC往返时不占用池内连接
+    async with acquire() as conn:
+        def _load():
+            cursor = conn.cursor()
+
+            # 获取遥操组所属节点
+            cursor.execute(
+                "SELECT node_id FROM teleop_groups WHERE id = ?", (id,)
+            )
+            return cursor.fetchone()
+
+        row = await run_in_threadpool(_load)
+
     if not row:
         raise HTTPException(status_code=404, detail="Teleop group not found")
-        
-    node_id = row[1]
+
+    node_id = row[0]
     if node_id not in node_websockets:
         raise HTTPException(status_code=400, detail="Node not connected")
-        
+
     try:
         # 发送启动遥操组的RPC请求
-        websocket = node_websockets[node_id]
-        rpc_id = int(time.time() * 1000)
-        config_data = json.loads(row[5]) if isinstance(row[5], str) else row[5]
-        # 确保config是列表类型
-        if not isinstance(config_data, list):
-            config_data = []
-        
-        rpc_request = {
-            "jsonrpc": "2.0",
-            "method": "node.start_teleop_group",
-            "params": {
-                "id": id,
-                # "config": config_data
-            },
-            "id": rpc_id
-        }
-        
-        # 发送请求
-        await websocket.send_text(json.dumps(rpc_request))
-        
-        # 等待并处理响应
-        result = await wait_for_response(websocket, node_id, rpc_id)
-        
+        result = await call_node_rpc(node_id, "node.start_teleop_group", {"id": id})
+
         # 检查结果，确保result是字典类型
         if not isinstance(result, dict) or result.get("success") is not True:
             raise HTTPException(status_code=400, detail="Failed to start teleop group")
-            
+
         # 更新数据库中的状态
-        cursor.execute(
-            "UPDATE teleop_groups SET status = 1, updated_at = datetime('now') WHERE id = ?",
-            (id,)
-        )
-        conn.commit()
-        
+        async with acquire() as conn:
+            def _mark_started():
+                with conn:
+                    conn.execute(
+                        "UPDATE teleop_groups SET status = 1, updated_at = ? WHERE id = ?",
+                        (_now_iso(), id)
+                    )
+
+            await run_in_threadpool(_mark_started)
+
         return {"message": "遥操组已启动"}
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @app.post("/api/teleop-groups/{id}/stop")
 async def stop_teleop_group(id: int):
     """停止遥操作组"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # 获取遥操组信息
-    cursor.execute(
-        """SELECT id, node_id, name, description, type, config, status 
-           FROM teleop_groups WHERE id = ?""",
-        (id,)
-    )
-    
-    row = cursor.fetchone()
+    # 连接只在两次数据库操作期间占用，RPC往返时不占用池内连接
+    async with acquire() as conn:
+        def _load():
+            cursor = conn.cursor()
+
+            # 获取遥操组所属节点
+            cursor.execute(
+                "SELECT node_id FROM teleop_groups WHERE id = ?", (id,)
+            )
+            return cursor.fetchone()
+
+        row = await run_in_threadpool(_load)
+
     if not row:
         raise HTTPException(status_code=404, detail="Teleop group not found")
-        
-    node_id = row[1]
+
+    node_id = row[0]
     if node_id not in node_websockets:
         raise HTTPException(status_code=400, detail="Node not connected")
-        
+
     try:
-        # 发送启动遥操组的RPC请求
-        websocket = node_websockets[node_id]
-        rpc_id = int(time.time() * 1000)
-        
-        rpc_request = {
-            "jsonrpc": "2.0",
-            "method": "node.stop_teleop_group",
-            "params": {
-                "id": id,
-            },
-            "id": rpc_id
-        }
-        
-        # 发送请求
-        await websocket.send_text(json.dumps(rpc_request))
-        
-        # 等待并处理响应
-        result = await wait_for_response(websocket, node_id, rpc_id)
-        
+        # 发送停止遥操组的RPC请求
+        result = await call_node_rpc(node_id, "node.stop_teleop_group", {"id": id})
+
         # 检查结果，确保result是字典类型
         if not isinstance(result, dict) or result.get("success") is not True:
             raise HTTPException(status_code=400, detail="Failed to stop teleop group")
-            
+
         # 更新数据库中的状态
-        cursor.execute(
-            "UPDATE teleop_groups SET status = 0, updated_at = datetime('now') WHERE id = ?",
-            (id,)
-        )
-        conn.commit()
-        
+        async with acquire() as conn:
+            def _mark_stopped():
+                with conn:
+                    conn.execute(
+                        "UPDATE teleop_groups SET status = 0, updated_at = ? WHERE id = ?",
+                        (_now_iso(), id)
+                    )
+
+            await run_in_threadpool(_mark_stopped)
+
         return {"message": "遥操组已停止动"}
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @app.delete("/api/teleop-groups/{id}", status_code=204)
-async def delete_teleop_group(id: int):
+async def delete_teleop_group(id: int, background: BackgroundTasks):
     """删除遥操作组"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        # 获取node_id用于通知
-        cursor.execute("SELECT node_id FROM teleop_groups WHERE id = ?", (id,))
-        row = cursor.fetchone()
-        
-        cursor.execute("DELETE FROM teleop_groups WHERE id = ?", (id,))
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Teleop group not found")
-            
-        conn.commit()
-        
-        if row:
-            # 通知对应的Node更新配置
-            await notify_node_config_update(row[0])
-            
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    async with acquire() as conn:
+        def _delete():
+            cursor = conn.cursor()
+
+            try:
+                # 单条语句完成删除并取回node_id用于通知
+                with conn:
+                    cursor.execute(
+                        "DELETE FROM teleop_groups WHERE id = ? RETURNING node_id", (id,)
+                    )
+                    row = cursor.fetchone()
+                    cursor.execute(
+                        "DELETE FROM teleop_group_devices WHERE teleop_group_id = ?", (id,)
+                    )
+
+                    if not row:
+                        raise HTTPException(status_code=404, detail="Teleop group not found")
+                    return row
+
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+        row = await run_in_threadpool(_delete)
+
+    if row:
+        # 提交成功后在后台通知对应的Node更新配置，不阻塞响应
+        background.add_task(notify_node_config_update, row[0])
 
 @app.get("/api/vrs", response_model=List[VRResponse])
 async def get_vrs(uuid: Optional[str] = Query(None)):
     """获取VR头显列表"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        if uuid:
-            cursor.execute(
-                "SELECT id, uuid, device_id, info, created_at, updated_at FROM vrs WHERE uuid = ?",
-                (uuid,)
-            )
-        else:
-            cursor.execute("SELECT id, uuid, device_id, info, created_at, updated_at FROM vrs")
-        
-        vrs = []
-        for row in cursor.fetchall():
+    async with acquire() as conn:
+        def _query():
+            cursor = conn.cursor()
+
             try:
-                info_data = json.loads(row[3]) if isinstance(row[3], str) else row[3]
-            except:
-                info_data = {}
-                
-            vrs.append(VRResponse(
-                id=row[0],
-                uuid=row[1],
-                device_id=row[2],
-                info=info_data,
-                created_at=row[4],
-                updated_at=row[5]
-            ))
-            
-        return vrs
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+                if uuid:
+                    cursor.execute(_SQL_LIST_VRS_BY_UUID, (uuid,))
+                else:
+                    cursor.execute(_SQL_LIST_VRS)
+
+                rows = cursor.fetchall()
+                # 相同的info字符串只解析一次
+                parsed = {
+                    raw: _parse_config(raw, {})
+                    for raw in {r["info"] for r in rows if isinstance(r["info"], str)}
+                }
+                return [
+                    VRResponse.model_construct(
+                        id=row["id"],
+                        uuid=row["uuid"],
+                        device_id=row["device_id"],
+                        info=parsed.get(row["info"], row["info"] or {}),
+                        created_at=row["created_at"],
+                        updated_at=row["updated_at"],
+                    )
+                    for row in rows
+                ]
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+        return await run_in_threadpool(_query)
 
 @app.post("/api/vrs", status_code=201)
 async def create_vr(vr: VRCreate):
     """创建VR头显记录"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute(
-            "INSERT INTO vrs (uuid, info) VALUES (?, ?)",
-            (vr.uuid, json.dumps(vr.info) if vr.info else "{}")
-        )
-        vr_id = cursor.lastrowid
-        conn.commit()
-        
-        return {"message": "头显已添加", "id": vr_id}
-    except sqlite3.IntegrityError as e:
-        conn.rollback()
-        if "UNIQUE constraint failed" in str(e):
-            raise HTTPException(status_code=409, detail="VR with this UUID already exists")
-        else:
-            raise HTTPException(status_code=500, detail=str(e))
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    async with acquire() as conn:
+        def _insert():
+            cursor = conn.cursor()
+
+            try:
+                with conn:
+                    cursor.execute(
+                        "INSERT INTO vrs (uuid, info) VALUES (?, ?)",
+                        (vr.uuid, orjson.dumps(vr.info).decode() if vr.info else "{}")
+                    )
+                    return {"message": "头显已添加", "id": cursor.lastrowid}
+            except sqlite3.IntegrityError as e:
+                if "UNIQUE constraint failed" in str(e):
+                    raise HTTPException(status_code=409, detail="VR with this UUID already exists")
+                else:
+                    raise HTTPException(status_code=500, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+        return await run_in_threadpool(_insert)
 
 @app.put("/api/vrs/{id}")
 async def update_vr(id: int, vr: VRUpdate):
     """更新VR头显配置"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        # 检查VR是否存在
-        cursor.execute("SELECT id FROM vrs WHERE id = ?", (id,))
-        row = cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="VR not found")
-        
-        # 构建更新语句
-        update_fields = []
-        params = []
-        
-        if vr.uuid is not None:
-            update_fields.append("uuid = ?")
-            params.append(vr.uuid)
-            
-        if vr.device_id is not None:
-            update_fields.append("device_id = ?")
-            params.append(vr.device_id)
-            
-        if vr.info is not None:
-            update_fields.append("info = ?")
-            params.append(json.dumps(vr.info))
-            
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No fields to update")
-            
-        update_fields.append("updated_at = datetime('now')")
-        params.append(id)
-        
-        query = f"UPDATE vrs SET {', '.join(update_fields)} WHERE id = ?"
-        cursor.execute(query, params)
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="VR not found")
-            
-        conn.commit()
-        
-        return {"message": "配置已更新"}
-    except HTTPException:
-        raise
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    async with acquire() as conn:
+        def _update():
+            cursor = conn.cursor()
+
+            try:
+                # 按字段掩码取预构建的UPDATE语句，参数顺序与掩码位序一致
+                mask = 0
+                params = []
+
+                if vr.uuid is not None:
+                    mask |= 1
+                    params.append(vr.uuid)
+
+                if vr.device_id is not None:
+                    mask |= 2
+                    params.append(vr.device_id)
+
+                if vr.info is not None:
+                    mask |= 4
+                    params.append(orjson.dumps(vr.info).decode())
+
+                if not mask:
+                    raise HTTPException(status_code=400, detail="No fields to update")
+
+                params.append(_now_iso())
+                params.append(id)
+
+                with conn:
+                    cursor.execute(_build_vr_update_sql(mask), params)
+                    if cursor.fetchone() is None:
+                        raise HTTPException(status_code=404, detail="VR not found")
+
+                return {"message": "配置已更新"}
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+        return await run_in_threadpool(_update)
 
 @app.delete("/api/vrs/{id}")
 async def delete_vr(id: int):
     """删除VR头显记录"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        # 检查VR是否存在
-        cursor.execute("SELECT id FROM vrs WHERE id = ?", (id,))
-        row = cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="VR not found")
-        
-        # 删除VR记录
-        cursor.execute("DELETE FROM vrs WHERE id = ?", (id,))
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="VR not found")
-            
-        conn.commit()
-        
-        return {"message": "头显已删除"}
-    except HTTPException:
-        raise
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+    async with acquire() as conn:
+        def _delete():
+            cursor = conn.cursor()
+
+            try:
+                with conn:
+                    # 单条语句完成删除，结果为空说明记录不存在
+                    cursor.execute("DELETE FROM vrs WHERE id = ? RETURNING id", (id,))
+                    if cursor.fetchone() is None:
+                        raise HTTPException(status_code=404, detail="VR not found")
+
+                return {"message": "头显已删除"}
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+
+        return await run_in_threadpool(_delete)
 
 # WebSocket端点
 @app.websocket("/ws/rpc")
 async def websocket_endpoint(websocket: WebSocket):
     """处理Node的WebSocket连接"""
     await websocket.accept()
-    
+
     # 使用字典封装node_id，使其修改能传递到外层
     connection_context = {"node_id": None}
     try:
-        # 继续处理后续消息
-        while True:
-            data = await websocket.receive_text()
-            print(f"Received message: {data}")
-            message = json.loads(data)
-            
+        # 迭代器在断开时自然结束，免去逐帧的receive状态检查；
+        # Node发送的是文本帧，orjson可直接解析str
+        async for data in websocket.iter_text():
+            # 热路径逐帧日志，先判级别避免无谓的参数打包
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Received message: %s", data)
+            message = orjson.loads(data)
+
             # 处理JSON-RPC请求
             if "method" in message:
                 response = await handle_jsonrpc_request(message, websocket, connection_context)
                 if response:
-                    await websocket.send_text(json.dumps(response))
-            
+                    # 注册后的连接统一经发送队列写出，避免与通知帧交错
+                    node_id = connection_context["node_id"]
+                    if node_id and node_id in node_websockets:
+                        await send_node_frame(node_id, orjson.dumps(response))
+                    else:
+                        await websocket.send_bytes(orjson.dumps(response))
+
             # 处理JSON-RPC响应
             elif "id" in message and ("result" in message or "error" in message):
                 await handle_jsonrpc_response(message, connection_context["node_id"])
-                
+
     except Exception as e:
-        print(f"WebSocket连接错误: {e}")
+        logger.warning("WebSocket连接错误: %s", e)
     finally:
         # 清理连接的节点
-        if connection_context["node_id"] and connection_context["node_id"] in node_websockets:
-            del node_websockets[connection_context["node_id"]]
-            print(f"Node {connection_context['node_id']} disconnected and removed from connection pool")
+        node_id = connection_context["node_id"]
+        # 节点重连后旧连接才断开时，映射已指向新socket，此时不应清理
+        if node_id and node_websockets.get(node_id) is websocket:
+            del node_websockets[node_id]
+            shutdown_node_sender(node_id)
+            purge_node_rpc_cache(node_id)
+            logger.info("Node %s disconnected and removed from connection pool", node_id)
+
+# 启动时读入首页并预压缩，根路由直接返回内存中的字节。
+# 路由须先于"/"挂载点注册，否则请求会落入StaticFiles。
+_index_bytes = b""
+_index_gzip = b""
+
+
+@app.get("/", include_in_schema=False)
+async def root(request: Request):
+    if _index_gzip and "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(
+            content=_index_gzip,
+            media_type="text/html",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+        )
+    return Response(content=_index_bytes, media_type="text/html")
 
 # 挂载静态文件夹
 app.mount("/", StaticFiles(directory="static"), name="static")
-@app.get("/", include_in_schema=False)
-async def root():
-    return RedirectResponse(url="/index.html")
 # 启动时初始化数据库
 @app.on_event("startup")
 async def startup_event():
     init_tables(DB_PATH)
-    from MQTTStatusSync import MQTTStatusSync
+    await init_pool()
+
+    global _index_bytes, _index_gzip
+    try:
+        _index_bytes = Path("static/index.html").read_bytes()
+        _index_gzip = gzip.compress(_index_bytes, 9)
+    except OSError as e:
+        logger.warning("预加载首页失败: %s", e)
+
+    # MQTT同步在线程池中启动，不阻塞uvicorn就绪
     mqtt_broker = os.environ.get("MQTT_BROKER", "localhost")
     mqtt_port = int(os.environ.get("MQTT_PORT", "1883"))
-    sync_service = MQTTStatusSync(
+    app.state.sync = MQTTStatusSync(
         db_path=DB_PATH,
         mqtt_broker=mqtt_broker,
         mqtt_port=mqtt_port
     )
-    
-    try:
-        # 启动同步服务
-        sync_service.start_sync()
-        print("MQTT状态同步服务已启动")
-            
-    except Exception as e:
-        print(f"MQTT状态同步服务运行出错: {str(e)}")
-        sync_service.stop_sync()
+
+    def _start_sync():
+        try:
+            app.state.sync.start_sync()
+            logger.info("MQTT状态同步服务已启动")
+        except Exception as e:
+            logger.error("MQTT状态同步服务运行出错: %s", e)
+            app.state.sync.stop_sync()
+
+    asyncio.get_running_loop().run_in_executor(None, _start_sync)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    sync_service = getattr(app.state, "sync", None)
+    if sync_service is not None:
+        try:
+            sync_service.stop_sync()
+        except Exception as e:
+            logger.warning("停止MQTT状态同步服务失败: %s", e)
+    await close_pool()
 
 
 if __name__ == "__main__":
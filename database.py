@@ -1,7 +1,17 @@
 import json
 import os
 import sqlite3
-from typing import Any, Dict, List
+import threading
+from typing import Any, Dict, List, Tuple
+
+import orjson
+
+# RETURNING is used throughout the write paths; require SQLite 3.35+
+# up front instead of failing on the first write.
+if sqlite3.sqlite_version_info < (3, 35, 0):
+    raise RuntimeError(
+        f"SQLite >= 3.35 is required (RETURNING support), found {sqlite3.sqlite_version}"
+    )
 
 # Shared database path under a folder to allow volume mounting
 DB_DIR = os.environ.get("DB_DIR", "data")
@@ -14,138 +24,286 @@ def get_connection(db_path: str = DB_PATH) -> sqlite3.Connection:
     return sqlite3.connect(db_path)
 
 
+# 全部建表/建索引DDL，一次executescript在单事务内完成
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uuid VARCHAR(36) UNIQUE NOT NULL,
+    status BOOLEAN DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS vrs(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uuid VARCHAR(36) UNIQUE NOT NULL,
+    device_id INTEGER,
+    info TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (device_id) REFERENCES devices(id)
+);
+
+CREATE TABLE IF NOT EXISTS devices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    node_id INTEGER NOT NULL,
+    name VARCHAR(20) NOT NULL,
+    description TEXT,
+    category VARCHAR(20) NOT NULL,
+    type VARCHAR(20) NOT NULL,
+    config TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    status INTEGER DEFAULT 0,
+    FOREIGN KEY (node_id) REFERENCES nodes (id)
+);
+
+CREATE TABLE IF NOT EXISTS teleop_groups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    node_id INTEGER NOT NULL,
+    name VARCHAR(20) NOT NULL,
+    description TEXT,
+    type VARCHAR(20) NOT NULL,
+    config TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    status BOOLEAN DEFAULT 0,
+    capture_status BOOLEAN DEFAULT 0,
+    FOREIGN KEY (node_id) REFERENCES nodes (id)
+);
+
+CREATE TABLE IF NOT EXISTS teleop_group_devices (
+    teleop_group_id INTEGER NOT NULL,
+    device_id INTEGER NOT NULL,
+    PRIMARY KEY (teleop_group_id, device_id),
+    FOREIGN KEY (teleop_group_id) REFERENCES teleop_groups (id),
+    FOREIGN KEY (device_id) REFERENCES devices (id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_devices_node_id ON devices(node_id);
+CREATE INDEX IF NOT EXISTS idx_teleop_groups_node_id ON teleop_groups(node_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_nodes_uuid ON nodes(uuid);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_vrs_uuid ON vrs(uuid);
+CREATE INDEX IF NOT EXISTS idx_vrs_device_id ON vrs(device_id);
+CREATE INDEX IF NOT EXISTS idx_teleop_group_devices_device_id
+    ON teleop_group_devices(device_id);
+"""
+
+
 def init_tables(db_path: str = DB_PATH) -> None:
-    """Initialize tables if they do not exist."""
+    """Initialize tables and indexes if they do not exist."""
     conn = sqlite3.connect(db_path)
+    conn.executescript(_SCHEMA_SQL)
+
+    # 为历史遥操组回填关联表（config列存的是设备id列表）
     cursor = conn.cursor()
+    cursor.execute("SELECT id, config FROM teleop_groups")
+    for group_id, config in cursor.fetchall():
+        try:
+            device_ids = json.loads(config) if isinstance(config, str) else config
+        except Exception:
+            continue
+        if isinstance(device_ids, list):
+            cursor.executemany(
+                "INSERT OR IGNORE INTO teleop_group_devices (teleop_group_id, device_id) VALUES (?, ?)",
+                [(group_id, d) for d in device_ids if isinstance(d, int)],
+            )
 
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS nodes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            uuid VARCHAR(36) UNIQUE NOT NULL,
-            status BOOLEAN DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-    )
+    conn.commit()
+    conn.close()
 
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS vrs(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            uuid VARCHAR(36) UNIQUE NOT NULL,
-            device_id INTEGER,
-            info TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (device_id) REFERENCES devices(id)
-        )
-        """
-    )
 
+def set_teleop_group_devices(
+    conn: sqlite3.Connection, group_id: int, device_ids: List[int]
+) -> None:
+    """Replace the device links for a teleop group (same transaction)."""
+    cursor = conn.cursor()
     cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS devices (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            node_id INTEGER NOT NULL,
-            name VARCHAR(20) NOT NULL,
-            description TEXT,
-            category VARCHAR(20) NOT NULL,
-            type VARCHAR(20) NOT NULL,
-            config TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            status INTEGER DEFAULT 0,
-            FOREIGN KEY (node_id) REFERENCES nodes (id)
-        )
-        """
+        "DELETE FROM teleop_group_devices WHERE teleop_group_id = ?", (group_id,)
     )
+    cursor.executemany(
+        "INSERT OR IGNORE INTO teleop_group_devices (teleop_group_id, device_id) VALUES (?, ?)",
+        [(group_id, d) for d in device_ids],
+    )
+
 
+def upsert_node(uuid: str, conn: sqlite3.Connection) -> int:
+    """Insert a node by uuid (or fetch the existing one) and return its id.
+
+    Uses a single INSERT ... ON CONFLICT ... RETURNING statement instead
+    of the SELECT-then-INSERT dance.
+    """
+    cursor = conn.cursor()
     cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS teleop_groups (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            node_id INTEGER NOT NULL,
-            name VARCHAR(20) NOT NULL,
-            description TEXT,
-            type VARCHAR(20) NOT NULL,
-            config TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            status BOOLEAN DEFAULT 0,
-            capture_status BOOLEAN DEFAULT 0,
-            FOREIGN KEY (node_id) REFERENCES nodes (id)
-        )
-        """
+        """INSERT INTO nodes (uuid) VALUES (?)
+           ON CONFLICT(uuid) DO UPDATE SET uuid = excluded.uuid
+           RETURNING id""",
+        (uuid,),
     )
-
+    node_id = cursor.fetchone()[0]
     conn.commit()
-    conn.close()
+    return node_id
 
 
-def get_node_devices(node_id: int, db_path: str = DB_PATH) -> List[Dict[str, Any]]:
-    """Return devices for a node with parsed config."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+# Parsed-config caches keyed by row id. Each entry keeps the raw string
+# it was parsed from, so a row updated elsewhere simply misses on the
+# string compare and gets re-parsed — no explicit invalidation needed.
+# Bounded LRU-style: deleted rows age out instead of leaking forever
+# (dicts iterate in insertion order, so the first key is the oldest).
+_CONFIG_CACHE_MAX = 1024
+_device_config_cache: Dict[int, Tuple[str, Any]] = {}
+_group_config_cache: Dict[int, Tuple[str, Any]] = {}
+# 缓存会被线程池里的多个工作线程并发读写，pop/回插与淘汰须持锁
+_config_cache_lock = threading.Lock()
+
+
+def _parse_config_cached(
+    cache: Dict[int, Tuple[str, Any]], row_id: int, raw: Any, default: Any
+) -> Any:
+    """Parse a JSON config column, reusing the cached object when the
+    stored string is unchanged since the last fetch."""
+    if not isinstance(raw, str):
+        return raw if raw is not None else default
+    with _config_cache_lock:
+        entry = cache.pop(row_id, None)
+        if entry is not None and entry[0] == raw:
+            cache[row_id] = entry
+            return entry[1]
+    try:
+        parsed = orjson.loads(raw)
+    except (ValueError, TypeError):
+        parsed = default
+    with _config_cache_lock:
+        if len(cache) >= _CONFIG_CACHE_MAX:
+            cache.pop(next(iter(cache)), None)
+        cache[row_id] = (raw, parsed)
+    return parsed
 
+
+def _fetch_devices(cursor: sqlite3.Cursor, node_id: int) -> List[Dict[str, Any]]:
     cursor.execute(
         "SELECT id, name, description, category, type, config FROM devices WHERE node_id = ?",
         (node_id,),
     )
 
+    # 直接迭代cursor（免fetchall物化整表），按列名取值
     devices: List[Dict[str, Any]] = []
-    for row in cursor.fetchall():
-        try:
-            config_data = json.loads(row[5]) if isinstance(row[5], str) else row[5]
-        except Exception:
-            config_data = {}
-
+    for row in cursor:
         devices.append(
             {
-                "id": row[0],
-                "name": row[1],
-                "description": row[2],
-                "category": row[3],
-                "type": row[4],
-                "config": config_data,
+                "id": row["id"],
+                "name": row["name"],
+                "description": row["description"],
+                "category": row["category"],
+                "type": row["type"],
+                "config": _parse_config_cached(
+                    _device_config_cache, row["id"], row["config"], {}
+                ),
             }
         )
 
-    conn.close()
     return devices
 
 
-def get_node_teleop_groups(node_id: int, db_path: str = DB_PATH) -> List[Dict[str, Any]]:
-    """Return teleop groups for a node with parsed config list."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
+def _fetch_teleop_groups(cursor: sqlite3.Cursor, node_id: int) -> List[Dict[str, Any]]:
     cursor.execute(
         "SELECT id, node_id, name, description, type, config FROM teleop_groups WHERE node_id = ?",
         (node_id,),
     )
 
     teleop_groups: List[Dict[str, Any]] = []
-    for row in cursor.fetchall():
-        try:
-            config_data = json.loads(row[5]) if isinstance(row[5], str) else row[5]
-            if not isinstance(config_data, list):
-                config_data = []
-        except Exception:
+    for row in cursor:
+        config_data = _parse_config_cached(
+            _group_config_cache, row["id"], row["config"], []
+        )
+        if not isinstance(config_data, list):
             config_data = []
 
         teleop_groups.append(
             {
-                "id": row[0],
-                "node_id": row[1],
-                "name": row[2],
-                "description": row[3],
-                "type": row[4],
+                "id": row["id"],
+                "node_id": row["node_id"],
+                "name": row["name"],
+                "description": row["description"],
+                "type": row["type"],
                 "config": config_data,
             }
         )
 
-    conn.close()
     return teleop_groups
+
+
+def get_node_devices(node_id: int, db_path: str = DB_PATH) -> List[Dict[str, Any]]:
+    """Return devices for a node with parsed config."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return _fetch_devices(conn.cursor(), node_id)
+    finally:
+        conn.close()
+
+
+def get_node_teleop_groups(node_id: int, db_path: str = DB_PATH) -> List[Dict[str, Any]]:
+    """Return teleop groups for a node with parsed config list."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return _fetch_teleop_groups(conn.cursor(), node_id)
+    finally:
+        conn.close()
+
+
+# 一次UNION ALL同时取回设备与遥操组，首列为行类型判别符
+_SQL_NODE_BUNDLE = """
+SELECT 'd' AS kind, id, node_id, name, description, category, type, config
+    FROM devices WHERE node_id = ?
+UNION ALL
+SELECT 'g', id, node_id, name, description, NULL, type, config
+    FROM teleop_groups WHERE node_id = ?
+"""
+
+
+def get_node_bootstrap(
+    node_id: int, conn: sqlite3.Connection
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Return (devices, teleop_groups) for a node in a single query.
+
+    Runs on the caller's connection (like upsert_node). One execute:
+    rows carry a discriminator column and are dispatched into the two
+    lists in Python.
+    """
+    cursor = conn.cursor()
+    cursor.execute(_SQL_NODE_BUNDLE, (node_id, node_id))
+
+    devices: List[Dict[str, Any]] = []
+    teleop_groups: List[Dict[str, Any]] = []
+    for kind, row_id, row_node_id, name, description, category, type_, config in cursor:
+        if kind == "d":
+            devices.append(
+                {
+                    "id": row_id,
+                    "name": name,
+                    "description": description,
+                    "category": category,
+                    "type": type_,
+                    "config": _parse_config_cached(
+                        _device_config_cache, row_id, config, {}
+                    ),
+                }
+            )
+        else:
+            group_config = _parse_config_cached(
+                _group_config_cache, row_id, config, []
+            )
+            teleop_groups.append(
+                {
+                    "id": row_id,
+                    "node_id": row_node_id,
+                    "name": name,
+                    "description": description,
+                    "type": type_,
+                    "config": group_config if isinstance(group_config, list) else [],
+                }
+            )
+
+    return devices, teleop_groups
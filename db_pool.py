@@ -0,0 +1,64 @@
+import asyncio
+import os
+import sqlite3
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from database import DB_PATH
+
+# 连接池大小，可通过环境变量调整
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+
+_pool: Optional[asyncio.Queue] = None
+
+
+def _create_connection() -> sqlite3.Connection:
+    """Create a long-lived sqlite3 connection with tuned pragmas."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-20000")
+    # 读多写少：mmap直接从页缓存映射读取，临时表放内存
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+async def init_pool(size: int = POOL_SIZE) -> None:
+    """Fill the pool with long-lived connections at app startup."""
+    global _pool
+    if _pool is not None:
+        return
+    _pool = asyncio.Queue(maxsize=size)
+    for _ in range(size):
+        _pool.put_nowait(_create_connection())
+
+
+async def close_pool() -> None:
+    """Drain the pool and close all connections at app shutdown."""
+    global _pool
+    if _pool is None:
+        return
+    while not _pool.empty():
+        _pool.get_nowait().close()
+    _pool = None
+
+
+@asynccontextmanager
+async def acquire() -> AsyncIterator[sqlite3.Connection]:
+    """Borrow a pooled connection; falls back to a temporary one if the
+    pool is not initialized (e.g. outside the FastAPI lifecycle)."""
+    if _pool is None:
+        conn = _create_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    conn = await _pool.get()
+    try:
+        yield conn
+    finally:
+        _pool.put_nowait(conn)
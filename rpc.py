@@ -1,113 +1,238 @@
 import asyncio
-import json
+import itertools
 import time
-from typing import Any, Dict
-import sqlite3
+from typing import Any, Dict, Tuple
 
+import orjson
 from fastapi import WebSocket
-from websockets.server import WebSocketServerProtocol
+from fastapi.concurrency import run_in_threadpool
+from starlette.websockets import WebSocketState
 
-from database import DB_PATH
+from database import upsert_node
+from db_pool import acquire
 
-# WebSocket connection pools and pending RPC responses
-node_websockets: Dict[int, WebSocketServerProtocol] = {}
-pending_responses: Dict[int, Dict[int, asyncio.Future]] = {}
+import logging
 
+logger = logging.getLogger(__name__)
 
-async def wait_for_response(
-    websocket: WebSocketServerProtocol, node_id: int, rpc_id: int, timeout: float = 30.0
-) -> Any:
-    """Wait for a JSON-RPC response tied to node_id + rpc_id."""
-    future: asyncio.Future = asyncio.Future()
+# WebSocket connection pools and pending RPC responses, the latter
+# keyed by (node_id, rpc_id) — one flat dict, one hash per operation
+node_websockets: Dict[int, WebSocket] = {}
+pending_responses: Dict[Tuple[int, int], asyncio.Future] = {}
 
-    if node_id not in pending_responses:
-        pending_responses[node_id] = {}
-    pending_responses[node_id][rpc_id] = future
+# Per-node outgoing frame queues, each drained by a single writer task.
+# Starlette does not guarantee that concurrent send_* calls from
+# different tasks won't interleave, so every outgoing frame is funneled
+# through the node's queue; the bound applies backpressure to producers
+# when a node reads slowly.
+_SEND_QUEUE_SIZE = 256
+_send_queues: Dict[int, asyncio.Queue] = {}
+_sender_tasks: Dict[int, asyncio.Task] = {}
 
+
+async def _sender_loop(node_id: int, websocket: WebSocket, queue: asyncio.Queue) -> None:
     try:
-        response = await asyncio.wait_for(future, timeout=timeout)
+        while True:
+            frame = await queue.get()
+            await websocket.send_bytes(frame)
+    except asyncio.CancelledError:
+        raise
+    except Exception as exc:
+        # 发送失败（节点中途断开等）：回收本连接的队列，唤醒阻塞的生产者。
+        # 重注册可能已换上新队列，仅在仍指向本队列时清理。
+        logger.warning("Node %s 发送帧失败，回收发送队列: %s", node_id, exc)
+        if _send_queues.get(node_id) is queue:
+            shutdown_node_sender(node_id)
+
+
+def register_node_sender(node_id: int, websocket: WebSocket) -> None:
+    """Attach a bounded send queue + writer task to a node connection.
+
+    On re-registration (node reconnected while the server still holds a
+    half-open socket) the stale sender is torn down first, so frames —
+    including the register response itself — bind to the new socket.
+    """
+    if node_id in _sender_tasks:
+        shutdown_node_sender(node_id)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=_SEND_QUEUE_SIZE)
+    _send_queues[node_id] = queue
+    _sender_tasks[node_id] = asyncio.get_running_loop().create_task(
+        _sender_loop(node_id, websocket, queue)
+    )
+
+
+def shutdown_node_sender(node_id: int) -> None:
+    """Stop the writer task and drop the queue (called on disconnect).
+
+    The queue is drained so producers blocked on a full queue wake up
+    instead of waiting on a sender that no longer exists.
+    """
+    task = _sender_tasks.pop(node_id, None)
+    if task is not None:
+        task.cancel()
+    queue = _send_queues.pop(node_id, None)
+    if queue is not None:
+        while not queue.empty():
+            queue.get_nowait()
+
+
+async def send_node_frame(node_id: int, frame: bytes) -> None:
+    """Enqueue a frame for the node's writer task.
+
+    Falls back to a direct send for not-yet-registered connections and
+    fails fast when the node is gone entirely.
+    """
+    queue = _send_queues.get(node_id)
+    if queue is not None:
+        await queue.put(frame)
+        return
+
+    websocket = node_websockets.get(node_id)
+    if websocket is None:
+        raise Exception("Node not connected")
+    await websocket.send_bytes(frame)
 
-        if isinstance(response, dict) and "error" in response:
-            error_info = response["error"]
-            if isinstance(error_info, dict):
-                code = error_info.get("code", "Unknown")
-                message = error_info.get("message", "Unknown error")
-                raise Exception(f"RPC Error {code}: {message}")
-            raise Exception(f"RPC Error: {error_info}")
-
-        if isinstance(response, dict):
-            return response.get("result")
-        return None
-    finally:
-        if node_id in pending_responses:
-            pending_responses[node_id].pop(rpc_id, None)
-            if not pending_responses[node_id]:
-                pending_responses.pop(node_id, None)
+# Monotonic RPC id source: wall-clock ms ids collide for concurrent
+# calls issued within the same millisecond, stealing each other's
+# pending future. next() on a count() is atomic under the GIL.
+_rpc_id_gen = itertools.count(1)
+
+
+def next_rpc_id() -> int:
+    """Return a process-unique JSON-RPC request id."""
+    return next(_rpc_id_gen)
+
+
+# Short-lived cache for node metadata RPCs (device/teleop-group types),
+# which only change when a node reconnects with new code.
+_rpc_cache: Dict[Tuple[int, str], Tuple[float, Any]] = {}
+_rpc_cache_lock = asyncio.Lock()
+
+
+async def cached_node_rpc(node_id: int, method: str, ttl: float = 30.0) -> Any:
+    """Call a parameterless node RPC, serving repeats from a TTL cache."""
+    key = (node_id, method)
+    async with _rpc_cache_lock:
+        entry = _rpc_cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+
+    result = await call_node_rpc(node_id, method, {})
+
+    async with _rpc_cache_lock:
+        _rpc_cache[key] = (time.monotonic() + ttl, result)
+    return result
+
+
+def purge_node_rpc_cache(node_id: int) -> None:
+    """Drop cached RPC results for a node (called on disconnect)."""
+    for key in [k for k in _rpc_cache if k[0] == node_id]:
+        _rpc_cache.pop(key, None)
+
+
+def _unwrap_response(response: Any) -> Any:
+    """Extract the result from a JSON-RPC response, raising on errors."""
+    if isinstance(response, dict) and "error" in response:
+        error_info = response["error"]
+        if isinstance(error_info, dict):
+            code = error_info.get("code", "Unknown")
+            message = error_info.get("message", "Unknown error")
+            raise Exception(f"RPC Error {code}: {message}")
+        raise Exception(f"RPC Error: {error_info}")
+
+    if isinstance(response, dict):
+        return response.get("result")
+    return None
 
 
 async def handle_jsonrpc_response(message: dict, node_id: int | None = None) -> None:
     """Handle JSON-RPC response and resolve waiting futures."""
     if isinstance(message, dict) and "id" in message and node_id is not None:
-        rpc_id = message["id"]
-        node_pending = pending_responses.get(node_id, {})
-        if rpc_id in node_pending:
-            future = node_pending[rpc_id]
-            if not future.done():
-                future.set_result(message)
+        future = pending_responses.get((node_id, message["id"]))
+        if future is not None and not future.done():
+            future.set_result(message)
 
 
-async def notify_node_config_update(node_id: int) -> None:
-    """Notify node to refresh configuration."""
+# Debounce window for config-update notifications. A burst of CRUD
+# calls against the same node collapses into a single frame; nodes
+# re-fetch their whole config on each notification anyway.
+_NOTIFY_DEBOUNCE = 0.1
+_pending_notifies: Dict[int, asyncio.TimerHandle] = {}
+
+# 通知帧内容固定，序列化一次即可（orjson直接产出bytes，走二进制帧免去编码）
+_UPDATE_CONFIG_FRAME = orjson.dumps(
+    {"jsonrpc": "2.0", "method": "node.update_config", "params": {}}
+)
+
+
+async def _send_config_update(node_id: int) -> None:
     if node_id in node_websockets:
-        websocket = node_websockets[node_id]
-        notification = {"jsonrpc": "2.0", "method": "node.update_config", "params": {}}
         try:
-            await websocket.send_text(json.dumps(notification))
+            await send_node_frame(node_id, _UPDATE_CONFIG_FRAME)
         except Exception as exc:
-            print(f"通知Node {node_id} 更新配置失败: {exc}")
+            logger.warning("通知Node %s 更新配置失败: %s", node_id, exc)
+
+
+def _fire_config_update(loop: asyncio.AbstractEventLoop, node_id: int) -> None:
+    _pending_notifies.pop(node_id, None)
+    loop.create_task(_send_config_update(node_id))
+
+
+async def notify_node_config_update(node_id: int) -> None:
+    """Notify node to refresh configuration (debounced)."""
+    loop = asyncio.get_running_loop()
+    handle = _pending_notifies.pop(node_id, None)
+    if handle is not None:
+        handle.cancel()
+    _pending_notifies[node_id] = loop.call_later(
+        _NOTIFY_DEBOUNCE, _fire_config_update, loop, node_id
+    )
+
+
+# 启停通知帧模板：group_id为int，%d格式化安全且免去每次JSON编码
+_TELEOP_FRAME_TMPL = {
+    "start": b'{"jsonrpc":"2.0","method":"node.start_teleop_group","params":{"id":%d}}',
+    "stop": b'{"jsonrpc":"2.0","method":"node.stop_teleop_group","params":{"id":%d}}',
+}
+
+
+async def _notify_teleop(node_id: int, group_id: int, action: str) -> None:
+    """Send a start/stop teleop-group notification to a node."""
+    websocket = node_websockets.get(node_id)
+    if websocket is None or websocket.client_state is WebSocketState.DISCONNECTED:
+        return
+
+    try:
+        await send_node_frame(node_id, _TELEOP_FRAME_TMPL[action] % group_id)
+    except Exception as exc:
+        logger.warning(
+            "通知Node %s %s遥操组 %s 失败: %s",
+            node_id, "启动" if action == "start" else "停止", group_id, exc,
+        )
 
 
 async def notify_node_start_teleop_group(node_id: int, group_id: int) -> None:
     """Notify node to start a teleop group."""
-    if node_id in node_websockets:
-        websocket = node_websockets[node_id]
-        notification = {
-            "jsonrpc": "2.0",
-            "method": "node.start_teleop_group",
-            "params": {"id": group_id},
-        }
-
-        try:
-            if websocket.state.name != "CLOSED":
-                await websocket.send_text(json.dumps(notification))
-        except Exception as exc:
-            print(f"通知Node {node_id} 启动遥操组 {group_id} 失败: {exc}")
+    await _notify_teleop(node_id, group_id, "start")
 
 
 async def notify_node_stop_teleop_group(node_id: int, group_id: int) -> None:
     """Notify node to stop a teleop group."""
-    if node_id in node_websockets:
-        websocket = node_websockets[node_id]
-        notification = {
-            "jsonrpc": "2.0",
-            "method": "node.stop_teleop_group",
-            "params": {"id": group_id},
-        }
-
-        try:
-            if websocket.state.name != "CLOSED":
-                await websocket.send_text(json.dumps(notification))
-        except Exception as exc:
-            print(f"通知Node {node_id} 停止遥操组 {group_id} 失败: {exc}")
+    await _notify_teleop(node_id, group_id, "stop")
 
 
 async def call_node_rpc(node_id: int, method: str, params: Any = None, timeout: float = 30.0) -> Any:
-    """Send an RPC request to a node and return the result."""
+    """Send an RPC request to a node and await its result.
+
+    The pending future is registered before the frame is sent, so the
+    websocket reader loop can resolve it even if the response arrives
+    immediately. Any number of calls to the same node can be in flight
+    concurrently; responses are matched by id.
+    """
     if node_id not in node_websockets:
         raise Exception("Node not connected")
 
-    websocket = node_websockets[node_id]
-    rpc_id = int(time.time() * 1000)
+    rpc_id = next_rpc_id()
     rpc_request = {
         "jsonrpc": "2.0",
         "method": method,
@@ -115,8 +240,15 @@ async def call_node_rpc(node_id: int, method: str, params: Any = None, timeout:
         "id": rpc_id,
     }
 
-    await websocket.send_text(json.dumps(rpc_request))
-    return await wait_for_response(websocket, node_id, rpc_id, timeout=timeout)
+    future: asyncio.Future = asyncio.get_running_loop().create_future()
+    pending_responses[(node_id, rpc_id)] = future
+
+    try:
+        await send_node_frame(node_id, orjson.dumps(rpc_request))
+        response = await asyncio.wait_for(future, timeout=timeout)
+        return _unwrap_response(response)
+    finally:
+        pending_responses.pop((node_id, rpc_id), None)
 
 
 async def handle_jsonrpc_request(
@@ -137,6 +269,7 @@ async def handle_jsonrpc_request(
                 connection_context["node_id"] = result["id"]
                 if connection_context["node_id"]:
                     node_websockets[connection_context["node_id"]] = websocket
+                    register_node_sender(connection_context["node_id"], websocket)
         else:
             response["error"] = {"code": -32601, "message": "Method not found"}
     except Exception as exc:
@@ -151,27 +284,17 @@ async def handle_node_register(params: dict, websocket: WebSocket) -> dict:
     if not node_uuid:
         raise Exception("Missing uuid parameter")
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    async with acquire() as conn:
+        def _register():
+            with conn:
+                return upsert_node(node_uuid, conn)
 
-    try:
-        cursor.execute("SELECT id FROM nodes WHERE uuid = ?", (node_uuid,))
-        result = cursor.fetchone()
+        # 写入（含fsync）放线程池，避免阻塞事件循环上的其他连接
+        node_id = await run_in_threadpool(_register)
 
-        if result:
-            node_id = result[0]
-        else:
-            cursor.execute("INSERT INTO nodes (uuid) VALUES (?)", (node_uuid,))
-            node_id = cursor.lastrowid
-
-        conn.commit()
-        node_websockets[node_id] = websocket
-        return {"id": node_id}
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+    node_websockets[node_id] = websocket
+    register_node_sender(node_id, websocket)
+    return {"id": node_id}
 
 
 async def handle_node_test_device(params: dict) -> int:
@@ -179,6 +302,6 @@ async def handle_node_test_device(params: dict) -> int:
     category = params.get("category")
     type_name = params.get("type")
     config = params.get("config")
-    print(f"Testing device: {category}.{type_name} with config {config}")
+    logger.debug("Testing device: %s.%s with config %s", category, type_name, config)
     await asyncio.sleep(3)
     return 1